@@ -1,17 +1,35 @@
 """
 Get weather forecasts for a location in the United States from National Weather Service (NWS).
 """
-import requests
+from types import MappingProxyType
+from typing import Final
+import numpy as np
 import pandas as pd
+from cachetools.func import ttl_cache
+from astroatmos.numba_compat import vectorize
+from astroatmos.web import get_session
 
+# NWS API requires a User-Agent and serves gzip-compressed JSON
+NWS_HEADERS = {'Accept-Encoding': 'gzip', 'User-Agent': 'astroatmos/1.0'}
+# NWS gridpoint forecast name for each forecast parameter
+NWS_PARS: Final = MappingProxyType({'cloud_cover': 'skyCover',
+                                    'dewpoint': 'dewpoint',
+                                    'temperature': 'temperature',
+                                    'precip': 'probabilityOfPrecipitation',
+                                    'wind_speed': 'windSpeed',
+                                    'wind_gust': 'windGust',
+                                    'wind_dir': 'windDirection'})
 
+
+@vectorize(['float32(float32)', 'float64(float64)'], cache=True)
 def c_to_f(temp):
     """
     Convert degrees Celsius to Fahrenheit
     """
-    return 9/5 * temp + 32
+    return 1.8 * temp + 32.0
 
 
+@vectorize(['float32(float32)', 'float64(float64)'], cache=True)
 def kmph_to_mph(speed):
     """
     Convert km/hr to mph
@@ -19,8 +37,67 @@ def kmph_to_mph(speed):
     return 0.6213712 * speed
 
 
+def split_intervals(ts):
+    """
+    Split NWS time series values with ISO 8601 intervals (e.g. '2024-09-05T16:00:00+00:00/PT1H') into start times,
+    durations, and values
+
+    Args:
+        ts (list): list of dicts with 'validTime' and 'value' keys
+
+    Returns:
+        tuple:
+            - start (numpy.ndarray): ISO 8601 start time strings
+            - duration (numpy.ndarray): ISO 8601 duration strings
+            - values (list): values for each interval
+    """
+    valid_times = np.array([v['validTime'] for v in ts], dtype='U')
+    start, _, duration = np.char.partition(valid_times, '/').T
+    return start, duration, [v['value'] for v in ts]
+
+
+@ttl_cache(maxsize=128, ttl=600)
+def _fetch_nws_grid(lat, lon, session):
+    """
+    Get forecast from NWS at given location in NWS units (degrees C, km/hr). Results are cached for 10 minutes.
+
+    Args:
+        lat (float): forecast latitude (decimal degrees)
+        lon (float): forecast longitude (decimal degrees)
+        session (requests.Session): session for HTTP requests
+
+    Returns:
+        nws_data (dict): dict of pandas.DataFrame objects for each forecast parameter
+    """
+    # TODO: localize times to forecast timezone? Should be local time for location already though...
+    # get gridpoint forecast endpoint
+    res = session.get(f'https://api.weather.gov/points/{lat},{lon}/', headers=NWS_HEADERS)
+    properties = res.json()['properties']
+    nws_forecast_endpoint = properties['forecastGridData']
+    nws_timezone = properties['timeZone']
+    # call gridpoint forecast
+    res = session.get(nws_forecast_endpoint, headers=NWS_HEADERS)
+    nws_forecast = res.json()
+    # parse variables we care about
+    series = {par: split_intervals(nws_forecast['properties'][nws_name]['values'])
+              for par, nws_name in NWS_PARS.items()}
+    # parameters mostly share the same start times, so only parse and localize the unique start times once
+    starts = pd.Index(np.unique(np.concatenate([start for start, _, _ in series.values()])))
+    times = pd.to_datetime(starts, format='ISO8601', utc=True).tz_convert(nws_timezone)
+    nws_data = {}
+    for par, (start, duration, values) in series.items():
+        time = times[starts.get_indexer(start)]
+        # missing values (None) become NaN
+        df = pd.DataFrame({'value': np.array(values, dtype=np.float32),
+                           'time': time,
+                           'duration': pd.to_timedelta(duration)},
+                          index=time)
+        nws_data[par] = df
+    return nws_data
+
+
 class NWS_met:
-    def __init__(self, lat, lon, temp_unit='F', wind_unit='mph'):
+    def __init__(self, lat, lon, temp_unit='F', wind_unit='mph', session=None):
         """
         Class for retrieving NWS weather forecast for a given location
 
@@ -29,11 +106,13 @@ class NWS_met:
             lon (float): forecast longitude (decimal degrees)
             temp_unit (str): 'F' or 'C', temperature unit
             wind_unit (str): 'mph' or 'km/hr', wind speed unit
+            session (requests.Session): session for HTTP requests (default: `web.get_session()`)
         """
         self.lat = lat
         self.lon = lon
         self.temp_unit = temp_unit
         self.wind_unit = wind_unit
+        self._session = session if session is not None else get_session()
 
     @property
     def temp_unit(self):
@@ -63,44 +142,17 @@ class NWS_met:
         Returns:
             nws_data (dict): dict of pandas.DataFrame objects for each forecast parameter
         """
-        # TODO: localize times to self.timezone? Should be local time for location already though...
-        # get gridpoint forecast endpoint
-        res = requests.get(f'https://api.weather.gov/points/{self.lat},{self.lon}/')
-        properties = res.json()['properties']
-        nws_forecast_endpoint = properties['forecastGridData']
-        nws_timezone = properties['timeZone']
-        # call gridpoint forecast
-        res = requests.get(nws_forecast_endpoint)
-        nws_forecast = res.json()
-        # parse variables we care about
-        pars = {'cloud_cover': 'skyCover',
-                'dewpoint': 'dewpoint',
-                'temperature': 'temperature',
-                'precip': 'probabilityOfPrecipitation',
-                'wind_speed': 'windSpeed',
-                'wind_gust': 'windGust',
-                'wind_dir': 'windDirection'}
-        nws_data = {par: [] for par in pars.keys()}
-        for par, nws_name in pars.items():
-            ts = nws_forecast['properties'][nws_name]
-            unit = ts['uom']
-            ts = ts['values']
-            df = pd.DataFrame(ts)
-            df[['time', 'duration']] = df.validTime.str.split('/', expand=True)
-            df['time'] = pd.to_datetime(df['time'])
-            df['duration'] = pd.to_timedelta(df['duration'])
-            df.index = df['time']
-            df.index = df.index.tz_convert(nws_timezone)
-            df['time'] = df.index
-            nws_data[par] = df
+        # nearby locations share the same NWS forecast grid cell, so reuse recent forecasts for the rounded location
+        nws_data = {par: df.copy()
+                    for par, df in _fetch_nws_grid(round(self.lat, 2), round(self.lon, 2), self._session).items()}
 
         if self.temp_unit == 'F':
             # convert C to F
-            nws_data['temperature'].value = c_to_f(nws_data['temperature'].value)
-            nws_data['dewpoint'].value = c_to_f(nws_data['dewpoint'].value)
+            for par in ['temperature', 'dewpoint']:
+                nws_data[par]['value'] = c_to_f(nws_data[par]['value'].to_numpy())
         if self.wind_unit == 'mph':
             # convert km/hr to mph
-            nws_data['wind_speed'].value = kmph_to_mph(nws_data['wind_speed'].value)
-            nws_data['wind_gust'].value = kmph_to_mph(nws_data['wind_gust'].value)
+            for par in ['wind_speed', 'wind_gust']:
+                nws_data[par]['value'] = kmph_to_mph(nws_data[par]['value'].to_numpy())
 
         return nws_data
@@ -1,25 +1,90 @@
 """
 Handles parsing and caching of RDPS astronomy model grids (seeing and transparency).
 """
-import io
 import os
-import pandas as pd
+import json
+from urllib.parse import urlparse
 import xarray as xr
-import requests
-import urllib.request
-from bs4 import BeautifulSoup
+from astroatmos.web import get_session, download_files, parse_listing
+try:
+    import pika
+except ImportError:
+    pika = None
+
+# size (grid cells) of the spatial tiles parameter grids are stored in
+ZARR_TILE_SIZE = 256
+
+
+class _AmqpListener:
+    def __init__(self, host, topic='v02.post.model_gem_regional.astronomy.#'):
+        """
+        Listener for notifications of new files published to the MSC Datamart AMQP feed. Requires `pika`.
+        See: https://eccc-msc.github.io/open-data/msc-datamart/amqp_en/
+
+        Args:
+            host (str): AMQP broker host, e.g. 'dd.weather.gc.ca'
+            topic (str): routing key for announcements of the desired files
+        """
+        if pika is None:
+            raise ImportError('pika is required to listen for AMQP notifications: pip install pika')
+        credentials = pika.PlainCredentials('anonymous', 'anonymous')
+        self.connection = pika.BlockingConnection(pika.ConnectionParameters(host, credentials=credentials))
+        self.channel = self.connection.channel()
+        self.queue = self.channel.queue_declare('', exclusive=True).method.queue
+        self.channel.queue_bind(self.queue, exchange='xpublic', routing_key=topic)
+
+    def get_urls(self, timeout):
+        """
+        Collect urls of announced files until no announcement arrives for `timeout` seconds
+
+        Args:
+            timeout (float): seconds to wait for the next announcement
+
+        Returns:
+            list: urls of announced files
+        """
+        urls = []
+        for method, properties, body in self.channel.consume(self.queue, auto_ack=True, inactivity_timeout=timeout):
+            if method is None:
+                break
+            urls.append(self.parse_message(body.decode()))
+        self.channel.cancel()
+        return urls
+
+    @staticmethod
+    def parse_message(body):
+        """
+        Get url of announced file from message body, either v03 (json) or v02 ('<timestamp> <base url> <path>')
+
+        Args:
+            body (str): message body
+
+        Returns:
+            str: url of announced file
+        """
+        if body.startswith('{'):
+            msg = json.loads(body)
+            return msg['baseUrl'].rstrip('/') + '/' + msg['relPath'].lstrip('/')
+        _, base_url, rel_path = body.split()[:3]
+        return base_url.rstrip('/') + '/' + rel_path.lstrip('/')
+
+    def close(self):
+        """Close connection to AMQP broker"""
+        self.connection.close()
 
 
 class RDPS_astro:
-    def __init__(self, forecast_dir):
+    def __init__(self, forecast_dir, session=None):
         """
         Class to handle parsing and caching of RDPS astronomy model grids (seeing and transparency).
 
         Attributes:
             forecast_dir (str): directory to cache forecast grids
+            session (requests.Session): session for HTTP requests (default: `web.get_session()`)
         """
         self.astro_endpoint = 'https://dd.alpha.meteo.gc.ca/model_gem_regional/astronomy/grib2/'
         self.forecast_dir = forecast_dir
+        self._session = session if session is not None else get_session()
         self.seeing_ds = None
         self.trsp_ds = None
         return
@@ -29,48 +94,101 @@ class RDPS_astro:
         Get latest RDPS run for astronomy parameters (seeing, transparency). This will download the most recent model
         run if not already cached. Data are loaded into xarray datasets self.seeing_ds and self.trsp_ds.
         '''
-        # TODO: implement updating procedure using AMQP: https://eccc-msc.github.io/open-data/msc-datamart/amqp_en/
+        # for updates pushed as files are published, see self.listen_RDPS_astro
         print('Getting astro data...')
-        res = requests.get(self.astro_endpoint)
+        res = self._session.get(self.astro_endpoint)
         # parse file directory to table
-        soup = BeautifulSoup(res.text, 'html.parser')
-        text = soup.find_all('pre')[0].text.split('\n')
-        df = pd.read_csv(io.StringIO(soup.find_all('pre')[0].text), sep=r"[ ]{2,}", engine='python')
-        df = df[['Name', 'Last modified']]
-        df['Last modified'] = pd.to_datetime(df['Last modified'])
+        df = parse_listing(res.text)
 
         # get most recent run and go to that endpoint
         most_recent_run = df[df['Last modified'] == df['Last modified'].max()]['Name'].values[0]
         self.astro_run_endpoint = self.astro_endpoint + most_recent_run
-        res = requests.get(self.astro_run_endpoint)
-        soup = BeautifulSoup(res.text, 'html.parser')
-        links = soup.find_all('pre')[0].find_all('a')
-        links = [a.get('href') for a in links if a.get('href').endswith('.grib2')]
-        for i, link in enumerate(links):
-            url = self.astro_run_endpoint + link
-            out_filename = f'./forecast_maps/{link}'
-            if os.path.exists(out_filename):
+        res = self._session.get(self.astro_run_endpoint)
+        links = [link for link in parse_listing(res.text)['Name'] if link.endswith('.grib2')]
+        # download any files not already cached
+        files = [(self.astro_run_endpoint + link, os.path.join(self.forecast_dir, link)) for link in links]
+        files = [(url, out_filename) for url, out_filename in files if not os.path.exists(out_filename)]
+        download_files(files, session=self._session)
+        # scan forecast directory once, removing files not from the latest run (zarr stores are directories)
+        with os.scandir(self.forecast_dir) as it:
+            entries = [(entry.name, entry.is_file()) for entry in it]
+        run_files = set(links)
+        grib_files = []
+        for f, is_file in entries:
+            if not is_file:
                 continue
-            print(f'{(i + 1) / len(links) * 100:.0f}%')
-            urllib.request.urlretrieve(url, filename=out_filename)
-        for f in os.listdir(self.forecast_dir):
-            if f.split('.')[0] + '.grib2' not in links:
+            if f.split('.')[0] + '.grib2' not in run_files:
                 os.remove(os.path.join(self.forecast_dir, f))
+            elif f.endswith('.grib2'):
+                grib_files.append(f)
+        grib_files.sort()
         print('Making xr datasets...')
-        seeing_ds = xr.concat(
-            [xr.load_dataset(os.path.join(self.forecast_dir, f), engine="cfgrib") for f in os.listdir(self.forecast_dir)
-             if f.endswith('.grib2') and '_SEEI_' in f],
-            dim='step').rename({'unknown': 'seeing'})
-        self.seeing_ds = self.parse_grib_ds(seeing_ds)
-
-        trsp_ds = xr.concat(
-            [xr.load_dataset(os.path.join(self.forecast_dir, f), engine="cfgrib") for f in os.listdir(self.forecast_dir)
-             if f.endswith('.grib2') and '_TRSP_' in f],
-            dim='step').rename({'unknown': 'transparency'})
-        self.trsp_ds = self.parse_grib_ds(trsp_ds)
+        self.seeing_ds = self.load_parameter([f for f in grib_files if '_SEEI_' in f], 'seeing')
+        self.trsp_ds = self.load_parameter([f for f in grib_files if '_TRSP_' in f], 'transparency')
 
         return self.seeing_ds, self.trsp_ds
 
+    def load_parameter(self, files, name):
+        """
+        Load dataset for an astronomy parameter. The parsed grib2 files are stored in a zarr store in
+        self.forecast_dir, which is reopened directly as long as it is newer than all of the grib2 files.
+
+        Args:
+            files (list): sorted grib2 file names in self.forecast_dir for the parameter
+            name (str): name of parameter, e.g. 'seeing'
+
+        Returns:
+            ds (xarray.Dataset): parsed dask-backed xarray dataset
+        """
+        zarr_path = os.path.join(self.forecast_dir, f'{name}.zarr')
+        latest_update = max(os.path.getmtime(os.path.join(self.forecast_dir, f)) for f in files)
+        if not os.path.exists(zarr_path) or os.path.getmtime(zarr_path) < latest_update:
+            ds = self.open_grib_files(files).rename({'unknown': name})
+            ds = self.parse_grib_ds(ds)
+            # store spatial tiles holding the full forecast time series, so reading the forecast at a single point
+            # only reads one tile rather than every forecast step's full grid
+            ds = ds.chunk({dim: -1 if dim == 'step' else ZARR_TILE_SIZE for dim in ds[name].dims})
+            ds.to_zarr(zarr_path, mode='w', consolidated=True)
+        return xr.open_zarr(zarr_path, consolidated=True)
+
+    def listen_RDPS_astro(self, timeout=60):
+        """
+        Download new RDPS astronomy grib2 files as they are announced on the MSC Datamart AMQP feed, rather than
+        polling the directory listings. Run self.get_latest_RDPS_astro afterwards to load the datasets. Requires `pika`.
+
+        Args:
+            timeout (float): stop listening once no file is announced for this many seconds (default: 60)
+
+        Returns:
+            list: names of downloaded files
+        """
+        listener = _AmqpListener(urlparse(self.astro_endpoint).hostname)
+        try:
+            urls = listener.get_urls(timeout)
+        finally:
+            listener.close()
+        files = [(url, os.path.join(self.forecast_dir, url.split('/')[-1])) for url in urls if url.endswith('.grib2')]
+        files = [(url, out_filename) for url, out_filename in files if not os.path.exists(out_filename)]
+        download_files(files, session=self._session)
+        return [os.path.basename(out_filename) for _, out_filename in files]
+
+    def open_grib_files(self, files):
+        """
+        Lazily open grib2 files from the RDPS astro model as a single dataset concatenated along forecast step. Files
+        are decoded in parallel with dask, and the grid coordinates are taken from the first file since all files
+        share the same grid.
+
+        Args:
+            files (list): sorted grib2 file names in self.forecast_dir
+
+        Returns:
+            ds (xarray.Dataset): dask-backed xarray dataset
+        """
+        paths = [os.path.join(self.forecast_dir, f) for f in files]
+        return xr.open_mfdataset(paths, engine='cfgrib', combine='nested', concat_dim='step', parallel=True,
+                                 chunks={'step': 1}, data_vars='all', coords='minimal', compat='override',
+                                 drop_variables=['valid_time'])
+
     def parse_grib_ds(self, ds):
         """
         Parse grib2 dataset in xarray from the RDPS astro model. Calculates time from model start time and timestep, and
@@ -9,6 +9,10 @@ from astropy.coordinates import get_body
 from astropy.coordinates import EarthLocation, AltAz, GeocentricTrueEcliptic
 from astropy import units as u
 import pickle
+import functools
+from astroatmos.numba_compat import njit
+
+icons_path = Path(__file__).parent / "icons"
 
 
 def get_body_alt(times, lat, lon, elevation, body_name):
@@ -26,8 +30,7 @@ def get_body_alt(times, lat, lon, elevation, body_name):
         float: altitude (degrees), same shape as times
     """
     times = Time(times)
-    # TODO: set height based on global DEM? Also assuming HAE is ~= MASL
-    loc = EarthLocation(lat=lat * u.deg, lon=lon * u.deg, height=elevation * u.m)
+    loc = get_location(lat, lon, elevation)
     body = get_body(body_name, times, loc)
     altazframe = AltAz(obstime=times, location=loc, pressure=0)
     body_trans = body.transform_to(altazframe)
@@ -35,6 +38,109 @@ def get_body_alt(times, lat, lon, elevation, body_name):
     return alts
 
 
+@functools.lru_cache(maxsize=32)
+def get_location(lat, lon, elevation):
+    """
+    Get (cached) astropy location on Earth
+
+    Args:
+        lat (float): latitude (decimal degrees)
+        lon (float): longitude (decimal degrees)
+        elevation (float): elevation in meters
+
+    Returns:
+        astropy.coordinates.EarthLocation: location on Earth
+    """
+    # TODO: set height based on global DEM? Also assuming HAE is ~= MASL
+    return EarthLocation(lat=lat * u.deg, lon=lon * u.deg, height=elevation * u.m)
+
+
+def get_body_alt_fast(times, lat, lon, elevation, body_name):
+    """
+    Get approximate altitude of the sun or moon at given time(s), lat/lon using low precision formulas from the
+    Astronomical Almanac (accurate to ~0.01 degrees for the sun and ~0.3 degrees for the moon). This is much faster than
+    `get_body_alt` when evaluating many times, e.g. for plotting. Falls back to `get_body_alt` for other bodies.
+
+    Args:
+        times: datetime(s) of observation
+        lat (float): latitude (decimal degrees)
+        lon (float): longitude (decimal degrees)
+        elevation (float): elevation in meters (negligible for the low precision formulas)
+        body_name (str): name of celestial body, e.g. 'sun', 'moon'
+
+    Returns:
+        float: altitude (degrees), same shape as times
+    """
+    if body_name not in ['sun', 'moon']:
+        return get_body_alt(times, lat, lon, elevation, body_name)
+    if np.issubdtype(np.asarray(times).dtype, np.datetime64):
+        # convert numpy datetimes to julian dates directly, without building astropy Time objects
+        jd = np.asarray(times, dtype='datetime64[ns]').view('int64') / 86400e9 + 2440587.5
+    else:
+        jd = Time(times).utc.jd
+    alts = _body_alt_kernel(np.ravel(jd).astype(np.float64), float(lat), float(lon), body_name == 'moon')
+    return alts.reshape(np.shape(jd))[()]
+
+
+@njit(cache=True)
+def _sin_deg(x):
+    return np.sin(np.radians(x))
+
+
+@njit(cache=True)
+def _sun_ra_dec(d):
+    """Low precision apparent right ascension, declination and horizontal parallax (radians) of the sun, d days from
+    J2000.0"""
+    g = 357.529 + 0.98560028 * d
+    q = 280.459 + 0.98564736 * d
+    ecl_lon = np.radians(q + 1.915 * _sin_deg(g) + 0.020 * _sin_deg(2 * g))
+    obliquity = np.radians(23.439 - 0.00000036 * d)
+    ra = np.arctan2(np.cos(obliquity) * np.sin(ecl_lon), np.cos(ecl_lon))
+    dec = np.arcsin(np.sin(obliquity) * np.sin(ecl_lon))
+    return ra, dec, np.radians(8.794 / 3600)
+
+
+@njit(cache=True)
+def _moon_ra_dec(d):
+    """Low precision geocentric right ascension, declination and horizontal parallax (radians) of the moon, d days from
+    J2000.0"""
+    t = d / 36525
+    ecl_lon = np.radians(218.32 + 481267.881 * t
+                         + 6.29 * _sin_deg(135.0 + 477198.87 * t) - 1.27 * _sin_deg(259.3 - 413335.36 * t)
+                         + 0.66 * _sin_deg(235.7 + 890534.22 * t) + 0.21 * _sin_deg(269.9 + 954397.74 * t)
+                         - 0.19 * _sin_deg(357.5 + 35999.05 * t) - 0.11 * _sin_deg(186.5 + 966404.03 * t))
+    ecl_lat = np.radians(5.13 * _sin_deg(93.3 + 483202.02 * t) + 0.28 * _sin_deg(228.2 + 960400.89 * t)
+                         - 0.28 * _sin_deg(318.3 + 6003.15 * t) - 0.17 * _sin_deg(217.6 - 407332.21 * t))
+    parallax = np.radians(0.9508 + 0.0518 * _sin_deg(224.9 + 477198.85 * t) + 0.0095 * _sin_deg(349.2 - 413335.38 * t)
+                          + 0.0078 * _sin_deg(325.7 + 890534.23 * t) + 0.0028 * _sin_deg(359.9 + 954397.70 * t))
+    # ecliptic to equatorial direction cosines
+    x = np.cos(ecl_lat) * np.cos(ecl_lon)
+    y = 0.9175 * np.cos(ecl_lat) * np.sin(ecl_lon) - 0.3978 * np.sin(ecl_lat)
+    z = 0.3978 * np.cos(ecl_lat) * np.sin(ecl_lon) + 0.9175 * np.sin(ecl_lat)
+    return np.arctan2(y, x), np.arcsin(z), parallax
+
+
+@njit(cache=True, fastmath=True)
+def _body_alt_kernel(jd, lat, lon, is_moon):
+    """Topocentric altitude (degrees) of the sun or moon at julian dates jd"""
+    alts = np.empty(jd.shape[0])
+    lat = np.radians(lat)
+    for i in range(jd.shape[0]):
+        d = jd[i] - 2451545.0
+        if is_moon:
+            ra, dec, parallax = _moon_ra_dec(d)
+        else:
+            ra, dec, parallax = _sun_ra_dec(d)
+        # local sidereal time and hour angle
+        lst = np.radians(280.46061837 + 360.98564736629 * d + lon)
+        hour_angle = lst - ra
+        alt = np.arcsin(np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(hour_angle))
+        # correct geocentric altitude for parallax
+        alt -= np.arcsin(np.sin(parallax) * np.cos(alt))
+        alts[i] = np.degrees(alt)
+    return alts
+
+
 def get_moon_illumination(times):
     """
     Get moon phase and percent illuminated from time
@@ -44,8 +150,8 @@ def get_moon_illumination(times):
 
     Returns:
         tuple:
-            - phase (str): name of lunar phase
-            - illumination percent (float): 0-100 value for percent of moon illuminated
+            - phase (str): name of lunar phase, same shape as times
+            - illumination percent (float): 0-100 value for percent of moon illuminated, same shape as times
     """
     times = Time(times)
     sun = get_body('sun', times)
@@ -56,26 +162,41 @@ def get_moon_illumination(times):
     phase_angle = np.arctan2(sun.distance * np.sin(elongation), moon.distance - sun.distance * np.cos(elongation)).value
     illumination = (1 + np.cos(phase_angle)) / 2
     illumination_percent = illumination * 100
-    if np.abs(phase_angle - 0) <= np.pi / 28:
-        phase = 'Full Moon'
-    elif np.abs(np.abs(phase_angle) - np.pi) <= np.pi / 28:
-        phase = 'New Moon'
-    elif np.abs(phase_angle - np.pi / 2) <= np.pi / 28:
-        phase = 'Third Quarter'
-    elif np.abs(phase_angle - - np.pi / 2) <= np.pi / 28:
-        phase = 'First Quarter'
-    elif 0 <= phase_angle <= np.pi / 2:
-        phase = 'Waning Gibbous'
-    elif np.pi / 2 <= phase_angle:
-        phase = 'Waning Crescent'
-    elif phase_angle <= -np.pi / 2:
-        phase = 'Waxing Crescent'
-    elif phase_angle <= 0:
-        phase = 'Waxing Gibbous'
-    else:
-        raise ValueError(f'Could not classify phase angle: {phase_angle}')
+    phase = phase_name(phase_angle)
+    if phase.ndim == 0:
+        phase = phase.item()
     return phase, illumination_percent
 
+
+def phase_name(phase_angle):
+    """
+    Get name of lunar phase from phase angle
+
+    Args:
+        phase_angle (float): lunar phase angle(s) (radians), in range (-pi, pi]
+
+    Returns:
+        numpy.ndarray: name of lunar phase, same shape as phase_angle
+    """
+    phase_angle = np.asarray(phase_angle)
+    tol = np.pi / 28
+    # conditions are checked in order, the first one met gives the phase
+    conditions = [np.abs(phase_angle) <= tol,
+                  np.abs(np.abs(phase_angle) - np.pi) <= tol,
+                  np.abs(phase_angle - np.pi / 2) <= tol,
+                  np.abs(phase_angle + np.pi / 2) <= tol,
+                  (0 <= phase_angle) & (phase_angle <= np.pi / 2),
+                  np.pi / 2 <= phase_angle,
+                  phase_angle <= -np.pi / 2,
+                  phase_angle <= 0]
+    phases = ['Full Moon', 'New Moon', 'Third Quarter', 'First Quarter',
+              'Waning Gibbous', 'Waning Crescent', 'Waxing Crescent', 'Waxing Gibbous']
+    phase = np.select(conditions, phases, default='')
+    if np.any(phase == ''):
+        raise ValueError(f'Could not classify phase angle: {phase_angle[phase == ""]}')
+    return phase
+
+
 def next_time_moon_phase(target_phase):
     """
     Get the next time that the moon is at a given phase
@@ -87,19 +208,47 @@ def next_time_moon_phase(target_phase):
     Returns:
         datetime.datetime: python datetime object for the next date the moon is at the corresponding phase
     """
+    moon_icons = get_moon_icons()
     if target_phase not in moon_icons.keys():
         raise ValueError(f'Invalid phase: {target_phase}. Must be one of: {moon_icons.keys()}')
-    now = Time(dt.datetime.now())
-    i = 0
-    while True:
-        delta_t = dt.timedelta(days=i)
-        phase, illum_percent = get_moon_illumination(now + delta_t)
-        if phase == target_phase:
-            return (now + delta_t).datetime.date()
-        i += 1
-        if i > 28:
-            raise ValueError(f'Cannot find target phase: {target_phase}')
+    # get phases for each day of the next lunar cycle at once
+    times = Time(dt.datetime.now()) + np.arange(29) * u.day
+    phases, illum_percents = get_moon_illumination(times)
+    matches = np.flatnonzero(phases == target_phase)
+    if not len(matches):
+        raise ValueError(f'Cannot find target phase: {target_phase}')
+    return times[matches[0]].datetime.date()
 
-icons_path = Path(__file__).parent / "icons"
-moon_icons = pickle.load(open(icons_path / "moon_markers.obj", "rb"))
-sun_icon = pickle.load(open(icons_path / "sun_marker.obj", "rb"))
+
+@functools.cache
+def get_moon_icons():
+    """
+    Get matplotlib markers for each lunar phase. Markers are loaded on first use and cached, and are only generated
+    from the svg images if the pickled markers are missing.
+
+    Returns:
+        dict: matplotlib.path.Path marker for each lunar phase name
+    """
+    markers_path = icons_path / "moon_markers.obj"
+    if not markers_path.exists():
+        from astroatmos.svg_marker import generate_moon_markers
+        return generate_moon_markers(icons_path)
+    with markers_path.open("rb") as f:
+        return pickle.load(f)
+
+
+@functools.cache
+def get_sun_icon():
+    """
+    Get matplotlib marker for the sun. Marker is loaded on first use and cached, and is only generated from the svg
+    image if the pickled marker is missing.
+
+    Returns:
+        matplotlib.path.Path: sun marker
+    """
+    marker_path = icons_path / "sun_marker.obj"
+    if not marker_path.exists():
+        from astroatmos.svg_marker import generate_marker_from_svg
+        return generate_marker_from_svg(icons_path / "sun.svg")
+    with marker_path.open("rb") as f:
+        return pickle.load(f)
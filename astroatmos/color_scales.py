@@ -40,12 +40,13 @@ if __name__ == "__main__":
 
     # Kp
     fig, ax = plt.subplots(figsize=(8, 2))
-    kp_cmap = mcolors.LinearSegmentedColormap.from_list('kp_cmap', [bar_color(k) for k in range(10)])
+    kp_colors = [bar_color(k) for k in range(10)]
+    kp_cmap = mcolors.LinearSegmentedColormap.from_list('kp_cmap', kp_colors)
     gradient = np.linspace(0, 9, 10)
     gradient = np.vstack((gradient, gradient))
     #ax.imshow(gradient, cmap=kp_cmap, aspect='auto')
     k_values = range(1, 10)
-    ax.bar(k_values, k_values, color=[bar_color(k) for k in k_values], edgecolor='black', width=1)
+    ax.bar(k_values, k_values, color=[kp_colors[k] for k in k_values], edgecolor='black', width=1)
     ax.set(xlim=(0.5, 9.5), ylim=(0, 9), title='Planetary k-index (Kp)')
     for i in [5, 6, 7, 8, 9]:
         ax.text(i-0.17, 2, f'G{int(i-4)}', c='black', size=15)
@@ -2,23 +2,132 @@
 Methods for generating and plotting a forecast.
 """
 import os
-import geopandas as gpd
+import concurrent.futures as cf
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.ticker import FixedLocator
 from matplotlib import dates as mdates
 import datetime as dt
-import pytz
+from zoneinfo import ZoneInfo
 from astroatmos.RDPS_astro import RDPS_astro
 from astroatmos.RDPS_met import RDPS_met
 from astroatmos.NWS_met import NWS_met
-from astroatmos.bodies import get_body_alt, get_moon_illumination, moon_icons, sun_icon
-from astroatmos.k_index import KIndex, bar_color
-from scipy.signal import argrelextrema
+from astroatmos.bodies import get_body_alt_fast, get_moon_illumination, get_moon_icons, get_sun_icon
+from astroatmos.k_index import KIndex, bar_colors
+from scipy.spatial import cKDTree
+from cachetools import cached, LRUCache
 from astroatmos.forecast_plot_style import astropy_mpl_style
 
 plt.style.use(astropy_mpl_style)
 
+# mean radius of Earth (m)
+EARTH_RADIUS = 6371000
+# colormaps for forecast strips, looked up once rather than on every plot
+CMAP_COOLWARM = plt.get_cmap('coolwarm')
+CMAP_COOLWARM_R = plt.get_cmap('coolwarm_r')
+# number of lookups on a model grid before a KD-tree is built for it (see GridIndex)
+GRID_TREE_MIN_LOOKUPS = 16
+
+
+def grid_key(lats, lons):
+    """
+    Get identifier of a model grid from its shape and corner coordinates. Parameters on the same model grid (e.g.
+    seeing and transparency, which are stored separately) share a key, and only the tiles at the corners of lazily
+    loaded coordinates are read.
+
+    Args:
+        lats (xarray.DataArray): latitudes of grid points
+        lons (xarray.DataArray): longitudes of grid points
+    Returns:
+        tuple: grid shape, corner latitudes and corner longitudes
+    """
+    corners = {dim: [0, -1] for dim in lats.dims}
+    return (lats.shape, tuple(lats.isel(corners).values.ravel()), tuple(lons.isel(corners).values.ravel()))
+
+
+class GridIndex:
+    def __init__(self, lats, lons):
+        """
+        Nearest neighbour index of model grid points. Lookups search the whole grid until the grid has been looked up
+        GRID_TREE_MIN_LOOKUPS times, after which a KD-tree is built, since building it costs about as much as that many
+        searches.
+
+        Args:
+            lats (numpy.ndarray): latitudes of grid points
+            lons (numpy.ndarray): longitudes of grid points
+        """
+        self.lats = lats
+        self.lons = lons
+        self.tree = None
+        self.n_lookups = 0
+
+    def query(self, lat, lon):
+        """
+        Find closest grid point to given lat/lon
+
+        Args:
+            lat (float): latitude of desired point
+            lon (float): longitude of desired point
+        Returns:
+            tuple:
+                - closest_idx (tuple): index of closest point on grid
+                - closest_dist (float): distance to closest point (m)
+        """
+        self.n_lookups += 1
+        if self.tree is None and self.n_lookups >= GRID_TREE_MIN_LOOKUPS:
+            # grid points as 3D unit vectors, so the nearest point by straight-line (chord) distance is also the nearest
+            # by great circle distance
+            self.tree = cKDTree(unit_vectors(self.lats.ravel(), self.lons.ravel()))
+        if self.tree is not None:
+            chord, closest_i = self.tree.query(unit_vectors(lat, lon))
+            closest_dist = 2 * np.arcsin(chord / 2) * EARTH_RADIUS
+        else:
+            # equirectangular approximation, accurate for the short distances between nearby grid points
+            dlat = np.radians(self.lats - lat)
+            dlon = np.radians((self.lons - lon + 180) % 360 - 180) * np.cos(np.radians(lat))
+            dist2 = dlat * dlat + dlon * dlon
+            closest_i = np.argmin(dist2)
+            closest_dist = EARTH_RADIUS * np.sqrt(dist2.flat[closest_i])
+        return np.unravel_index(closest_i, self.lats.shape), closest_dist
+
+
+def unit_vectors(lat, lon):
+    """
+    Convert lat/lon to 3D unit vectors (Earth-centered Cartesian coordinates on the unit sphere)
+
+    Args:
+        lat: latitude(s) (decimal degrees)
+        lon: longitude(s) (decimal degrees)
+    Returns:
+        numpy.ndarray: unit vectors, with shape (..., 3)
+    """
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def local_extrema(values, window=5):
+    """
+    Find indices of local maxima and minima of a time series, after smoothing with a moving average so that small
+    fluctuations are not reported as highs/lows
+
+    Args:
+        values (numpy.ndarray): 1D array of values
+        window (int): width of moving average window (number of samples)
+    Returns:
+        tuple:
+            - high_is (numpy.ndarray): indices of local maxima
+            - low_is (numpy.ndarray): indices of local minima
+    """
+    # pad with edge values so the moving average isn't pulled towards zero at the ends
+    padded = np.pad(values, window // 2, mode='edge')
+    smoothed = np.convolve(padded, np.ones(window) / window, mode='valid')
+    slope = np.sign(np.diff(smoothed))
+    high_is = np.flatnonzero((slope[:-1] > 0) & (slope[1:] < 0)) + 1
+    low_is = np.flatnonzero((slope[:-1] < 0) & (slope[1:] > 0)) + 1
+    return high_is, low_is
+
 
 class Forecast:
     """
@@ -33,17 +142,19 @@ class Forecast:
         met_dir (str): directory to store RDPS model meteorology outputs
         temp_unit (str): 'F' or 'C', indicating unit for temperature measurements
         wind_unit (str): 'mph' or 'km/hr', indicating unit for wind speed measurements
+        dpi (int): resolution of saved forecast plot (dots per inch)
     """
-    def __init__(self, forecast_dir='./forecast_maps', met_dir='./met_maps', temp_unit='F', wind_unit='mph'):
+    def __init__(self, forecast_dir='./forecast_maps', met_dir='./met_maps', temp_unit='F', wind_unit='mph', dpi=200):
         self.forecast_dir = forecast_dir
         self.met_dir = met_dir
         self.forecast = None
         self.lat = None
         self.lon = None
         self.elevation = 0
-        self.timezone = pytz.UTC
+        self.timezone = ZoneInfo('UTC')
         self.temp_unit = temp_unit
         self.wind_unit = wind_unit
+        self.dpi = dpi
 
     @property
     def forecast_dir(self):
@@ -98,7 +209,7 @@ class Forecast:
     @timezone.setter
     def timezone(self, timezone):
         if isinstance(timezone, str):
-            timezone = pytz.timezone(timezone)
+            timezone = ZoneInfo(timezone)
         self._timezone = timezone
 
     @property
@@ -121,10 +232,25 @@ class Forecast:
             raise ValueError(f'Invalid wind_unit: {wind_unit}. Must be "km/hr" or "mph".')
         self._wind_unit = wind_unit
 
+    @staticmethod
+    @cached(LRUCache(maxsize=8), key=grid_key)
+    def get_grid_index(lats, lons):
+        """
+        Get nearest neighbour index of model grid. Indexes are cached by grid (see `grid_key`), so datasets on the same
+        grid (e.g. seeing and transparency) share one index and the grid coordinates are only read once.
+
+        Args:
+            lats (xarray.DataArray): latitudes of grid points
+            lons (xarray.DataArray): longitudes of grid points
+        Returns:
+            GridIndex: index of grid points
+        """
+        return GridIndex(lats.values, lons.values)
+
     @staticmethod
     def get_closest_grid_point(ds, lat, lon):
         """
-        Get data at closest point on model grid to given lat/lon (calculated in EPSG 3857 Web Mercator) for xarray ds
+        Get data at closest point on model grid to given lat/lon for xarray ds (see `GridIndex`)
 
         Args:
             ds (xarray.Dataset): xarray dataset with 'latitude' and 'longitude' coordinates
@@ -133,18 +259,24 @@ class Forecast:
         Returns:
             xarray.Dataset: dataset subset to the grid cell closest to the given lat/lon point.
         """
-        df = ds[['latitude', 'longitude']].to_dataframe().reset_index()
-        gdf = gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df['longitude'], df['latitude']), crs="EPSG:4326")
-        gdf = gdf.to_crs("EPSG:3857")
-        point = gpd.GeoSeries(gpd.points_from_xy([lon], [lat], crs="EPSG:4326").to_crs("EPSG:3857")).iloc[0]
-        closest_pt = gdf.loc[np.argmin(gdf.distance(point))]
-        closest_dist = closest_pt.geometry.distance(point)
-        closest_x, closest_y = closest_pt[['x', 'y']]
-        point_ds = ds.sel(x=closest_x, y=closest_y)
+        closest_idx, closest_dist = Forecast.get_grid_index(ds['latitude'], ds['longitude']).query(lat, lon)
+        # datasets are opened lazily and stored in spatial tiles, so only the tile with the closest grid cell is read
+        point_ds = ds.isel(dict(zip(ds['latitude'].dims, closest_idx))).load()
         print(f'Closest grid point: ({point_ds.latitude:.4f}, {point_ds.longitude:.4f})\n'
               f'Distance: {closest_dist:.0f} m')
         return point_ds
 
+    def _to_local(self, times):
+        """
+        Convert naive UTC times to the forecast timezone
+
+        Args:
+            times: naive datetimes in UTC
+        Returns:
+            pandas.DatetimeIndex: timezone-aware times in self.timezone
+        """
+        return pd.DatetimeIndex(times).tz_localize('UTC').tz_convert(self.timezone)
+
     def forecast_location(self, lat, lon, timezone, elevation=0):
         # TODO: split into different files/classes for pulling data from each source
         """
@@ -153,7 +285,7 @@ class Forecast:
         Args:
             lat (float): latitude of forecast location
             lon (float): longitude of forecast location
-            timezone (str or pytz.timezone: timezone for location
+            timezone (str or zoneinfo.ZoneInfo): timezone for location
             elevation (float): elevation of location in meters (default: 0)
         Returns:
             self.forecast (dict): Forecast data for the given location/timezone
@@ -164,9 +296,17 @@ class Forecast:
         self.timezone = timezone
         self.elevation = elevation
 
-        # get RDPS astro data (seeing, transparency) and extract data at forecast location
+        # get RDPS astro data (seeing, transparency), NWS forecast at location, and predicted k-index. Data sources are
+        # independent and network bound, so fetch them concurrently
         rdps = RDPS_astro(forecast_dir=self.forecast_dir)
-        seeing_ds, trsp_ds = rdps.get_latest_RDPS_astro()
+        nws = NWS_met(lat=self.lat, lon=self.lon, temp_unit=self.temp_unit, wind_unit=self.wind_unit)
+        with cf.ThreadPoolExecutor(max_workers=3) as executor:
+            rdps_future = executor.submit(rdps.get_latest_RDPS_astro)
+            nws_future = executor.submit(nws.get_nws_met)
+            kp_future = executor.submit(KIndex().get_pred)
+            seeing_ds, trsp_ds = rdps_future.result()
+            nws_forecast = nws_future.result()
+            kp = kp_future.result()
         # get closest point to desired coordinates
         point_seeing = self.get_closest_grid_point(seeing_ds, self.lat, self.lon)
         point_transparency = self.get_closest_grid_point(trsp_ds, self.lat, self.lon)
@@ -176,10 +316,6 @@ class Forecast:
         #rdps_met_data = rdps_met.get_latest_RDPS_met()
         #point_cloud_cover = self.get_closest_grid_point(rdps_met_data['cloud_cover'], self.lat, self.lon)
 
-        # get NWS forecast at location
-        nws = NWS_met(lat=self.lat, lon=self.lon, temp_unit=self.temp_unit, wind_unit=self.wind_unit)
-        nws_forecast = nws.get_nws_met()
-
         # total forecast
         self.forecast = {'lat': self.lat,
                          'lon': self.lon,
@@ -188,7 +324,7 @@ class Forecast:
                          'seeing': point_seeing,
                          'transparency': point_transparency,
                          'cloud_cover': nws_forecast['cloud_cover'],
-                         'kp': KIndex().get_pred(),
+                         'kp': kp,
                          'temperature': nws_forecast['temperature'],
                          'dewpoint': nws_forecast['dewpoint'],
                          'precip': nws_forecast['precip'],
@@ -208,7 +344,11 @@ class Forecast:
         # get current datetime for indicating on plot
         now = dt.datetime.now(tz=self.timezone)
         # initialize figure
-        fig, axes = plt.subplots(7, figsize=(14, 4), sharex=True)
+        # for headless runs (ASTROATMOS_HEADLESS set), render a standalone figure without pyplot, so no GUI toolkit is
+        # started and the figure is freed once saved
+        headless = bool(os.environ.get('ASTROATMOS_HEADLESS'))
+        fig = Figure(figsize=(14, 4)) if headless else plt.figure(figsize=(14, 4))
+        axes = fig.add_gridspec(7, hspace=0).subplots(sharex=True)
         # TODO: currently assuming NW hemisphere
         fig.suptitle(fr'Stargazing Forecast for ({self.forecast["lat"]:.3f}$^{{\circ}}$N, '
                      fr'{abs(self.forecast["lon"]):.3f}$^{{\circ}}$W)'
@@ -219,50 +359,49 @@ class Forecast:
 
         # plot cloud cover and precip
         ax = axes[0]
-        ax.bar(self.forecast['cloud_cover'].time, 1,
-               color=plt.get_cmap('coolwarm')(self.forecast['cloud_cover'].value / 100),
-               align='edge', width=self.forecast['cloud_cover'].duration, zorder=0)
-        ax.bar(self.forecast['precip'].time, self.forecast['precip'].value / 100,
-               color='grey', edgecolor='black', align='edge', width=self.forecast['precip'].duration, zorder=1)
+        cloud_cover = self.forecast['cloud_cover']
+        precip = self.forecast['precip']
+        # draw each colored strip as a single mesh, with cell edges at the start of each time interval
+        cloud_times = mdates.date2num(cloud_cover.time)
+        cloud_edges = np.append(cloud_times, cloud_times[-1] + cloud_cover.duration.iloc[-1] / pd.Timedelta(days=1))
+        ax.pcolormesh(cloud_edges, [0, 1], cloud_cover.value.values[np.newaxis, :],
+                      cmap=CMAP_COOLWARM, vmin=0, vmax=100, zorder=0)
+        ax.bar(precip.time, precip.value / 100,
+               color='grey', edgecolor='black', align='edge', width=precip.duration, zorder=1)
         ax.set(ylim=(0, 1))
         ax.set_ylabel("Cloud cover", rotation=0, fontsize=10, labelpad=labelpad)
-        ax.axvline(now, linestyle='dashed', color='black')
         ax.get_yaxis().set_ticks([])
         ax.grid(zorder=1)
 
         # plot transparency
         ax = axes[1]
-        dts = self.forecast['transparency'].time.values.astype('datetime64[s]').astype(dt.datetime).tolist()
-        dts = [self.timezone.fromutc(t) for t in dts]
-        trsp_freq = np.median([t2 - t1 for t1, t2 in zip(dts[:-1], dts[1:])])
-        ax.bar(dts, 1, color=plt.get_cmap('coolwarm_r')((self.forecast['transparency'].transparency - 1) / 4),
-               align='edge', width=trsp_freq, zorder=0)
+        trsp_times = self.forecast['transparency'].time.values
+        trsp_edges = np.append(trsp_times, trsp_times[-1] + np.median(np.diff(trsp_times)))
+        ax.pcolormesh(trsp_edges, [0, 1], self.forecast['transparency'].transparency.values[np.newaxis, :],
+                      cmap=CMAP_COOLWARM_R, vmin=1, vmax=5, zorder=0)
         ax.set(ylim=(0, 1))
         ax.set_ylabel("Transparency", rotation=0, fontsize=10, labelpad=labelpad)
-        ax.axvline(now, linestyle='dashed', color='black')
         ax.get_yaxis().set_ticks([])
         ax.grid(zorder=1)
 
         # plot seeing
         ax = axes[2]
-        dts = self.forecast['seeing'].time.values.astype('datetime64[s]').astype(dt.datetime).tolist()
-        dts = [self.timezone.fromutc(t) for t in dts]
-        seeing_freq = np.median([t2 - t1 for t1, t2 in zip(dts[:-1], dts[1:])])
-        ax.bar(dts, 1, color=plt.get_cmap('coolwarm_r')((self.forecast['seeing'].seeing - 1) / 4),
-               align='edge', width=seeing_freq, zorder=0)
+        seeing_times = self.forecast['seeing'].time.values
+        seeing_edges = np.append(seeing_times, seeing_times[-1] + np.median(np.diff(seeing_times)))
+        ax.pcolormesh(seeing_edges, [0, 1], self.forecast['seeing'].seeing.values[np.newaxis, :],
+                      cmap=CMAP_COOLWARM_R, vmin=1, vmax=5, zorder=0)
         ax.set(ylim=(0, 1))
         ax.set_ylabel("Seeing", rotation=0, fontsize=10, labelpad=labelpad)
-        ax.axvline(now, linestyle='dashed', color='black')
         ax.get_yaxis().set_ticks([])
         ax.grid(zorder=1)
 
         # plot kp
         ax = axes[3]
-        k_ts = [self.timezone.fromutc(t) for t in self.forecast['kp'].index]
+        k_ts = self._to_local(self.forecast['kp'].index)
         k_vals = [float(k.split(' ')[0]) for k in self.forecast['kp'].values]
         k_storms = [k.split(' ')[1] if len(k.split(' ')) > 1 else '' for k in self.forecast['kp'].values]
-        kp_freq = np.median([t2 - t1 for t1, t2 in zip(k_ts[:-1], k_ts[1:])])
-        ax.bar(k_ts, k_vals, color=[bar_color(k) for k in k_vals],
+        kp_freq = pd.Timedelta(np.median(np.diff(k_ts.values)))
+        ax.bar(k_ts, k_vals, color=bar_colors(k_vals),
                align='edge', edgecolor='black', width=kp_freq, zorder=0)
         ax.set(ylim=(0, 9))
         # overlay text with geomagnetic storm level if storm predicted
@@ -270,7 +409,6 @@ class Forecast:
             if storm_level and ax.get_xlim()[0] <= mdates.date2num(t) <= ax.get_xlim()[1]:
                 ax.text(t + kp_freq / 4, 0.5, storm_level.replace('(', '').replace(')', ''), c='k')
         ax.set_ylabel('Kp', rotation=0, fontsize=10, labelpad=labelpad)
-        ax.axvline(now, linestyle='dashed', color='black')
         ax.get_yaxis().set_ticks([])
         ax.grid(zorder=1)
 
@@ -279,23 +417,24 @@ class Forecast:
         times = np.linspace(self.forecast['seeing'].time.values[0].astype('float64'),
                             (self.forecast['seeing'].time.values[-1] + np.timedelta64(1, 'h')).astype('float64'),
                             1000).astype('datetime64[ns]')
-        sun_alts = get_body_alt(times, self.lat, self.lon, self.elevation, 'sun')
-        moon_alts = get_body_alt(times, self.lat, self.lon, self.elevation, 'moon')
+        # append current (UTC) time so the path and current position of each body are computed in one call
+        all_times = np.append(times, pd.Timestamp(now).tz_convert('UTC').tz_localize(None).to_datetime64())
+        sun_alts = get_body_alt_fast(all_times, self.lat, self.lon, self.elevation, 'sun')
+        sun_alts, sun_alt = sun_alts[:-1], sun_alts[-1]
+        moon_alts = get_body_alt_fast(all_times, self.lat, self.lon, self.elevation, 'moon')
+        moon_alts, moon_alt = moon_alts[:-1], moon_alts[-1]
 
         # plot sun/moon paths, day/night
         ax = axes[4]
-        plot_times = [self.timezone.fromutc(t)
-                      for t in times.astype('datetime64[s]').astype(dt.datetime).tolist()]
+        plot_times = self._to_local(times)
         # plot sun
         ax.plot(plot_times, sun_alts, color='gold', label='sun', zorder=1)
-        sun_alt = get_body_alt(now, self.lat, self.lon, self.elevation, 'sun')
-        ax.scatter([now], [sun_alt], marker=sun_icon,
+        ax.scatter([now], [sun_alt], marker=get_sun_icon(),
                    s=200, zorder=2, c='gold')
         # plot moon
         ax.plot(plot_times, moon_alts, label='moon', zorder=1)
-        moon_alt = get_body_alt(now, self.lat, self.lon, self.elevation, 'moon')
         moon_phase, moon_illum_percent = get_moon_illumination(now)
-        ax.scatter([now], [moon_alt], marker=moon_icons[moon_phase],
+        ax.scatter([now], [moon_alt], marker=get_moon_icons()[moon_phase],
                    s=200, zorder=2, edgecolors='black')
         # plot night/astronomical twilight
         ax.fill_between(plot_times, -90, 90, sun_alts < 0, color='0.5', zorder=0)
@@ -305,36 +444,31 @@ class Forecast:
         # format plot
         ax.set(ylim=(-90, 90))
         ax.set_ylabel('Altitude', rotation=0, fontsize=10, labelpad=labelpad)
-        ax.axvline(now, linestyle='dashed', color='black', zorder=1)
-        ax.xaxis.set_major_locator(mdates.HourLocator(byhour=[0, 3, 6, 9, 12, 15, 18, 21],
-                                                      tz=self.timezone))
         ax.yaxis.set_major_locator(FixedLocator([-90, -45, 0, 45, 90]))
         ax.yaxis.set_major_formatter(lambda x, _: fr'{x}$^{{\circ}}$')
         ax.get_yaxis().set_ticks([])
 
         # plot temp/dewpoint
-        # TODO: lowpass temp for calculating lows/highs
         ax = axes[5]
         temp = self.forecast['temperature']
         dewpoint = self.forecast['dewpoint']
-        ax.plot(temp.time, temp.value, label='temperature')
-        high_is = argrelextrema(temp.value.values, np.greater)[0]
-        low_is = argrelextrema(temp.value.values, np.less)[0]
+        temp_values = temp.value.values
+        ax.plot(temp.time, temp_values, label='temperature')
+        high_is, low_is = local_extrema(temp_values)
         for i in high_is:
             if temp.time.iloc[i] > now and mdates.date2num(temp.time.iloc[i].to_numpy()) < ax.get_xlim()[1]:
-                ax.text(temp.time.iloc[i], temp.value.iloc[i] - 5,
-                        fr'{temp.value.iloc[i]:.0f} $^{{\circ}}${self.temp_unit}',
+                ax.text(temp.time.iloc[i], temp_values[i] - 5,
+                        fr'{temp_values[i]:.0f} $^{{\circ}}${self.temp_unit}',
                         ha='center', va='top', size='x-small', c='k')
         for i in low_is:
             if temp.time.iloc[i] > now and mdates.date2num(temp.time.iloc[i].to_numpy()) < ax.get_xlim()[1]:
-                ax.text(temp.time.iloc[i], temp.value.iloc[i],
-                        fr'{temp.value.iloc[i]:.0f}$^{{\circ}}${self.temp_unit}',
+                ax.text(temp.time.iloc[i], temp_values[i],
+                        fr'{temp_values[i]:.0f}$^{{\circ}}${self.temp_unit}',
                         ha='center', va='bottom', size='x-small', c='k')
         ax.plot(dewpoint.time, dewpoint.value, label='dewpoint')
         ax.set_ylabel('Temp/Dewpoint', rotation=0, fontsize=10, labelpad=labelpad)
         ax.yaxis.set_major_formatter(lambda x, _: fr'{x}$^{{\circ}}$')
         ax.get_yaxis().set_ticks([])
-        ax.axvline(now, linestyle='dashed', color='black', zorder=1)
 
         # plot wind/gusts
         ax = axes[6]
@@ -345,9 +479,12 @@ class Forecast:
         ax.plot(wind_gust.time, wind_gust.value, c='crimson', linestyle='dotted')
         ax.set(ylim=(0, 1.1 * wind_gust.value.max()))
         ax.set_ylabel(f'Wind ({self.wind_unit})', rotation=0, fontsize=10, labelpad=labelpad - 5)
-        ax.axvline(now, linestyle='dashed', color='black', zorder=1)
 
         # format figure
+        for ax in axes:
+            ax.axvline(now, linestyle='dashed', color='black', zorder=1)
+
+        # x axis is shared, so ticks only need to be set on the bottom axes
         def date_formatter(x, _):
             x = mdates.num2date(x, tz=self.timezone)
             if x.hour == 12:
@@ -356,11 +493,13 @@ class Forecast:
                 return f"{x.strftime('%-I')}\n|"
             else:
                 return x.strftime('%-I')
-        ax.xaxis.set_major_formatter(date_formatter)
+        axes[-1].xaxis.set_major_locator(mdates.HourLocator(byhour=[0, 3, 6, 9, 12, 15, 18, 21], tz=self.timezone))
+        axes[-1].xaxis.set_major_formatter(date_formatter)
         fig.tight_layout()
-        fig.subplots_adjust(hspace=0, top=0.85)
-        fig.savefig('forecast.jpg', dpi=800)
-        plt.show()
+        fig.subplots_adjust(top=0.85)
+        fig.savefig('forecast.jpg', dpi=self.dpi, pil_kwargs={'optimize': True, 'progressive': True})
+        if not headless:
+            plt.show()
         return
 
 
@@ -1,15 +1,28 @@
 """
 Gets Planetary k-index and geomagnetic storm levels from NOAA SWPC.
 """
+import bisect
 import datetime as dt
-import requests
+import functools
 import re
 import json
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from astroatmos.web import get_session
 plt.style.use('bmh')
 
+# geomagnetic storm levels (G-scale), descriptions and NOAA SWPC colors, in order of increasing k-index
+_G_LEVELS = (('', 'None', '#92d050'),
+             ('G1', 'Minor', '#f6eb14'),
+             ('G2', 'Moderate', '#ffc800'),
+             ('G3', 'Strong', '#ff9600'),
+             ('G4', 'Severe', '#ff0000'),
+             ('G5', 'Extreme', '#c80000'))
+# k-index thresholds of each geomagnetic storm level (G1-G5)
+_K_THRESH = (4.5, 5.5, 6.5, 7.5, 9.0)
+_K_COLORS = np.array([color for _, _, color in _G_LEVELS])
+
 
 def g_level(k):
     """
@@ -23,33 +36,22 @@ def g_level(k):
             - short_desc (str): Description of storm level, e.g. 'Minor', 'Moderate', etc.
             - color (str): hex color corresponding to NOAA SWPC color palette for storm level
     """
-    if k < 4.5:
-        g_scale = ''
-        short_desc = 'None'
-        color = '#92d050'
-    elif k < 5.5:
-        g_scale = 'G1'
-        short_desc = 'Minor'
-        color = '#f6eb14'
-    elif k < 6.5:
-        g_scale = 'G2'
-        short_desc = 'Moderate'
-        color = '#ffc800'
-    elif k < 7.5:
-        g_scale = 'G3'
-        short_desc = 'Strong'
-        color = '#ff9600'
-    elif k < 9:
-        g_scale = 'G4'
-        short_desc = 'Severe'
-        color = '#ff0000'
-    else:
-        g_scale = 'G5'
-        short_desc = 'Extreme'
-        color = '#c80000'
-    return g_scale, short_desc, color
+    return _G_LEVELS[bisect.bisect_right(_K_THRESH, k)]
+
+
+def g_level_bulk(ks):
+    """
+    Get geomagnetic storm levels for many k-index values at once
+    Args:
+        ks (array-like): planetary k-index values
+
+    Returns:
+        numpy.ndarray: index of storm level (0 for none, 1-5 for G1-G5), same shape as ks
+    """
+    return np.searchsorted(_K_THRESH, np.asarray(ks, dtype=float), side='right').astype(np.int8)
 
 
+@functools.lru_cache(maxsize=32)
 def bar_color(k):
     """
     Get color for bar plot of k-index corresponding to NOAA SWPC palette
@@ -63,14 +65,30 @@ def bar_color(k):
     return color
 
 
+def bar_colors(ks):
+    """
+    Get colors for bar plot of many k-index values at once, corresponding to NOAA SWPC palette
+    Args:
+        ks (array-like): planetary k-index values
+
+    Returns:
+        numpy.ndarray: hex codes for corresponding colors, same shape as ks
+    """
+    return _K_COLORS[g_level_bulk(ks)]
+
+
 class KIndex:
-    def __init__(self):
+    def __init__(self, session=None):
         """
         Class for getting Planetary k-index data from NOAA SWPC
+
+        Args:
+            session (requests.Session): session for HTTP requests (default: `web.get_session()`)
         """
         self.k_obs_endpoint = 'https://services.swpc.noaa.gov/products/noaa-planetary-k-index.json'
         self.k_pred_endpoint = 'https://services.swpc.noaa.gov/text/3-day-forecast.txt'
         self.k_data = None
+        self._session = session if session is not None else get_session()
 
     def run(self):
         """
@@ -90,7 +108,7 @@ class KIndex:
         Returns:
             pandas.DataFrame: table of observed k-index time series
         """
-        res = requests.get(self.k_obs_endpoint)
+        res = self._session.get(self.k_obs_endpoint)
         k_data = json.loads(res.text)
         k_data = pd.DataFrame(k_data[1:], columns=k_data[0])
         k_data['time'] = pd.to_datetime(k_data['time_tag'])
@@ -107,7 +125,7 @@ class KIndex:
         Returns:
             pandas.DataFrame: table of predicted k-index time series
         """
-        res = requests.get(self.k_pred_endpoint)
+        res = self._session.get(self.k_pred_endpoint)
         all_lines = res.text.split('\n')
         data_lines = []
         hit_data = False
@@ -122,20 +140,15 @@ class KIndex:
         df = pd.DataFrame(lines[1:])
         df.columns = ['time_range'] + lines[0][1:] + ['null']
         df = df.drop('null', axis=1)
+        # one row per (time range, date) cell, skipping any empty cells from short rows
+        long = df.melt(id_vars='time_range', var_name='date', value_name='k').dropna(subset=['k'])
         now = dt.datetime.now()
-        datetimes = []
-        ks = []
-        for i, row in df.iterrows():
-            for colname in df.columns[1:]:
-                date = colname
-                time_range = row['time_range']
-                datetime = dt.datetime.strptime(f'{now.year} {date} {time_range.split("-")[0]}', '%Y %b %d %H')
-                if now - datetime > dt.timedelta(days=2):
-                    datetime = dt.datetime.strptime(f'{now.year + 1} {date} {time_range.split("-")[0]}', '%Y %b %d %H')
-                datetimes.append(datetime)
-                ks.append(row[colname])
-        pred_ks = pd.Series(ks, datetimes).sort_index()
-        self.pred_ks = pred_ks
+        # parse dates and start hours of time ranges (e.g. '00-03UT') separately, without building a string per cell
+        hours = pd.to_timedelta(long['time_range'].str.slice(0, 2).astype(int), unit='h')
+        datetimes = pd.to_datetime(long['date'] + f' {now.year}', format='%b %d %Y') + hours
+        # forecast dates more than 2 days in the past are from next year (forecast spans new year)
+        datetimes = datetimes.mask(now - datetimes > pd.Timedelta(days=2), datetimes + pd.DateOffset(years=1))
+        self.pred_ks = pd.Series(long['k'].values, index=pd.DatetimeIndex(datetimes)).sort_index()
         return self.pred_ks
 
     def make_summary(self):
@@ -161,7 +174,7 @@ class KIndex:
         fig, ax = plt.subplots(figsize=(10, 5))
         ax.grid(zorder=0)
         timestep = np.median(self.k_data['time'].diff().iloc[1:])
-        ax.bar(self.k_data.index, self.k_data['Kp'], color=[bar_color(k) for k in self.k_data['Kp']],
+        ax.bar(self.k_data.index, self.k_data['Kp'], color=bar_colors(self.k_data['Kp'].values),
                width=timestep, align='edge', edgecolor='black', zorder=3)
         ax.set(xlabel='Time (UTC)', ylabel='Kp', title='Planetary K-index',
                ylim=(0, max(9, self.k_data['Kp'].max())),
@@ -0,0 +1,16 @@
+"""
+Optional numba decorators. When numba is not installed, stand-ins are provided that leave functions as plain Python.
+"""
+try:
+    from numba import njit, vectorize
+except ImportError:
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit when numba is not installed, returns the function unchanged"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+    def vectorize(*args, **kwargs):
+        """Stand-in for numba.vectorize when numba is not installed, returns the function unchanged"""
+        return lambda f: f
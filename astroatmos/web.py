@@ -0,0 +1,112 @@
+"""
+Shared HTTP session and helpers for downloading remote forecast data.
+"""
+import os
+import re
+import functools
+import concurrent.futures as cf
+import pandas as pd
+from requests.adapters import HTTPAdapter
+from requests_cache import CachedSession
+
+# maximum number of concurrent file downloads
+MAX_WORKERS = 16
+# size of chunks (bytes) written to disk while downloading files
+CHUNK_SIZE = 1 << 20
+# first <pre> block of a directory listing page
+_PRE_RE = re.compile(r'<pre[^>]*>(.*?)</pre>', re.S)
+# entries of a directory listing, e.g. '<a href="00/">00/</a>     2024-09-05 03:21    -'
+_LISTING_ROW_RE = re.compile(r'<a href="([^"]+)">[^<]*</a>\s+(\d{4}-\d{2}-\d{2} \d{2}:\d{2})')
+
+
+def is_cacheable(res):
+    """
+    Whether a response should be stored in the HTTP cache. Large grib2 files are cached on disk separately.
+
+    Args:
+        res (requests.Response): response to check
+
+    Returns:
+        bool: True if response should be cached
+    """
+    return not res.url.endswith('.grib2')
+
+
+@functools.cache
+def get_session():
+    """
+    Get shared HTTP session, created on first use. Connections are kept alive and reused between requests. Responses
+    are cached in the user cache directory, and once expired they are revalidated with conditional requests
+    (ETag/Last-Modified) so unchanged data is not downloaded again.
+
+    Returns:
+        requests_cache.CachedSession: shared session
+    """
+    session = CachedSession('astroatmos_http', backend='sqlite', use_cache_dir=True, cache_control=True,
+                            expire_after=300, urls_expire_after={'api.weather.gov/points': 86400,
+                                                                 'services.swpc.noaa.gov': 1800},
+                            filter_fn=is_cacheable)
+    session.mount('https://', HTTPAdapter(pool_connections=8, pool_maxsize=2 * MAX_WORKERS))
+    return session
+
+
+def download_file(url, out_path, session=None):
+    """
+    Download a file to disk
+
+    Args:
+        url (str): url of file to download
+        out_path (str): path to save downloaded file
+        session (requests.Session): session for HTTP requests (default: shared session from `get_session`)
+    """
+    if session is None:
+        session = get_session()
+    # stream to a temporary file and rename once complete, so a partial download is never mistaken for a cached file
+    tmp_path = out_path + '.tmp'
+    try:
+        with session.get(url, stream=True) as res:
+            res.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for chunk in res.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, out_path)
+
+
+def download_files(files, max_workers=MAX_WORKERS, session=None):
+    """
+    Download files concurrently, since each download is bound by network latency rather than CPU
+
+    Args:
+        files (list): list of (url, out_path) tuples for each file to download
+        max_workers (int): maximum number of concurrent downloads
+        session (requests.Session): session for HTTP requests (default: shared session from `get_session`)
+    """
+    if not files:
+        return
+    with cf.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(download_file, url, out_path, session) for url, out_path in files]
+        for i, future in enumerate(cf.as_completed(futures)):
+            # raise any exception from the download
+            future.result()
+            print(f'{(i + 1) / len(futures) * 100:.0f}%')
+
+
+def parse_listing(html):
+    """
+    Parse a server directory listing page (e.g. from MSC Datamart) into a table of entries. Header and parent
+    directory links are skipped since they have no modification time.
+
+    Args:
+        html (str): html text of directory listing
+
+    Returns:
+        pandas.DataFrame: table of entries with 'Name' (link to entry) and 'Last modified' (datetime) columns
+    """
+    text = _PRE_RE.search(html).group(1)
+    df = pd.DataFrame(_LISTING_ROW_RE.findall(text), columns=['Name', 'Last modified'])
+    df['Last modified'] = pd.to_datetime(df['Last modified'], format='%Y-%m-%d %H:%M')
+    return df
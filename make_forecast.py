@@ -11,7 +11,7 @@ def parse_forecast_location():
         tuple:
             - lat (float): forecast location latitude (decimal degrees)
             - lon (float): forecast location longitude (decimal degrees)
-            - timezone (str, or pytz.timezone): forecast location timezone
+            - timezone (str, or zoneinfo.ZoneInfo): forecast location timezone
             - elevation (float): forecast location elevation (m)
             - temp_unit (str): 'C' or 'F', temperature units
             - wind_unit (str): 'km/hr' or 'mph', wind units